@@ -4,32 +4,184 @@ import warnings
 warnings.filterwarnings('ignore')
 import io
 import os
-import base64
 import json
+import importlib
+import builtins
+import base64
+try:
+    # pybase64 为可选依赖（pip install "ddddocr[fast]"），安装后使用其SIMD实现加速base64编解码
+    import pybase64
+    b64decode, b64encode = pybase64.b64decode, pybase64.b64encode
+except ImportError:
+    b64decode, b64encode = base64.b64decode, base64.b64encode
 import pathlib
-import onnxruntime
+import threading
+import functools
+import weakref
 from PIL import Image, ImageChops
 import numpy as np
-import cv2
 
+_onnxruntime = None
+_cv2 = None
+
+
+def get_onnxruntime():
+    # onnxruntime 导入耗时较多，推迟到首次加载模型时再导入，只使用滑块功能时不会加载
+    global _onnxruntime
+    if _onnxruntime is None:
+        _onnxruntime = importlib.import_module('onnxruntime')
+        _onnxruntime.set_default_logger_severity(3)
+    return _onnxruntime
+
+
+def get_cv2():
+    # opencv 只在目标检测与滑块中使用，同样推迟到首次使用时再导入，只做文字识别时不会加载
+    global _cv2
+    if _cv2 is None:
+        _cv2 = importlib.import_module('cv2')
+    return _cv2
+
+
+def __getattr__(name):
+    # 兼容通过 ddddocr.onnxruntime / ddddocr.cv2 访问的旧代码
+    if name == 'onnxruntime':
+        return get_onnxruntime()
+    if name == 'cv2':
+        return get_cv2()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
-onnxruntime.set_default_logger_severity(3)
 
 def base64_to_image(img_base64):
-    img_data = base64.b64decode(img_base64)
+    img_data = b64decode(img_base64)
     return Image.open(io.BytesIO(img_data))
 
 
 def get_img_base64(single_image_path):
     with open(single_image_path, 'rb') as fp:
-        img_base64 = base64.b64encode(fp.read())
+        img_base64 = b64encode(fp.read())
         return img_base64.decode()
 
 
+def ctc_greedy_decode(indexes, charset):
+    # 去掉与前一位相同的下标及空白符0后映射为字符，第一位按前一位为0处理
+    indexes = np.asarray(indexes).ravel()
+    keep = indexes != 0
+    keep[1:] &= indexes[1:] != indexes[:-1]
+    return ''.join([charset[item] for item in indexes[keep].tolist()])
+
+
 class TypeError(Exception):
     pass
 
 
+# set_ranges 预置的字符范围，7 为除去英文、数字的全部字符，需结合模型字符集计算
+CHARSET_RANGES = {
+    # 数字
+    0: "0123456789",
+    # 小写英文
+    1: "abcdefghijklmnopqrstuvwxyz",
+    # 大写英文
+    2: "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    # 混合英文
+    3: "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    # 小写英文+数字
+    4: "abcdefghijklmnopqrstuvwxyz0123456789",
+    # 大写英文+数字
+    5: "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
+    # 混合大小写+数字
+    6: "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
+}
+
+
+class OrtSession(object):
+    # 缓存中的onnx会话及加载时模型文件的修改时间；由使用它的DdddOcr实例持有，弱引用字典无法直接保存元组
+    __slots__ = ('session', 'mtime', '__weakref__')
+
+    def __init__(self, session, mtime):
+        self.session = session
+        self.mtime = mtime
+
+
+# 已加载的onnx会话，同一模型文件+同一后端配置在进程内只加载一次，多个DdddOcr实例共享；
+# 使用弱引用保存，最后一个使用该会话的实例释放后会话（及其显存）随之释放
+_ort_sessions = weakref.WeakValueDictionary()
+_ort_sessions_lock = threading.Lock()
+
+
+def clear_session_cache():
+    # 清空会话缓存，之后新建的实例会重新加载模型；已创建的实例仍可继续使用各自的会话
+    with _ort_sessions_lock:
+        _ort_sessions.clear()
+
+
+def get_env_threads(name):
+    # 未设置或为空时返回0，即使用onnxruntime默认线程数
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return 0
+    try:
+        threads = int(value)
+    except ValueError:
+        threads = -1
+    if threads < 0:
+        raise ValueError("环境变量 {} 应为非负整数，当前值为 {!r}".format(name, value))
+    return threads
+
+
+def load_ort_session(graph_path, providers):
+    # 可通过环境变量设置onnxruntime线程数，多进程/多线程部署时避免每个会话都占满全部核心，0为onnxruntime默认值
+    intra_op_num_threads = get_env_threads('DDDDOCR_INTRA_OP_THREADS')
+    inter_op_num_threads = get_env_threads('DDDDOCR_INTER_OP_THREADS')
+    key = (os.path.abspath(graph_path), repr(providers), intra_op_num_threads, inter_op_num_threads)
+    mtime = os.path.getmtime(graph_path)
+    with _ort_sessions_lock:
+        cached = _ort_sessions.get(key)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+        # 模型文件被改写后重新加载，并替换掉旧会话，不再保留旧模型占用的内存
+        onnxruntime = get_onnxruntime()
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.intra_op_num_threads = intra_op_num_threads
+        sess_options.inter_op_num_threads = inter_op_num_threads
+        cached = OrtSession(onnxruntime.InferenceSession(graph_path, sess_options=sess_options, providers=providers),
+                            mtime)
+        _ort_sessions[key] = cached
+    return cached
+
+
+@functools.lru_cache(maxsize=8)
+def get_grids(img_size, p6=False):
+    # 同一输入尺寸的网格坐标与步长每次都相同，只构造一次，返回只读的float32数组
+    grids = []
+    expanded_strides = []
+
+    if not p6:
+        strides = [8, 16, 32]
+    else:
+        strides = [8, 16, 32, 64]
+
+    hsizes = [img_size[0] // stride for stride in strides]
+    wsizes = [img_size[1] // stride for stride in strides]
+
+    for hsize, wsize, stride in zip(hsizes, wsizes, strides):
+        xv, yv = np.meshgrid(np.arange(wsize), np.arange(hsize))
+        grid = np.stack((xv, yv), 2).reshape(1, -1, 2)
+        grids.append(grid)
+        shape = grid.shape[:2]
+        expanded_strides.append(np.full((*shape, 1), stride))
+
+    grids = np.concatenate(grids, 1).astype(np.float32)
+    expanded_strides = np.concatenate(expanded_strides, 1).astype(np.float32)
+    grids.setflags(write=False)
+    expanded_strides.setflags(write=False)
+    return grids, expanded_strides
+
+
+# Pillow 10 移除了 ANTIALIAS，导入时补一次即可，无需每次实例化都检查
+if not hasattr(Image, 'ANTIALIAS'):
+    setattr(Image, 'ANTIALIAS', Image.LANCZOS)
+
+
 def png_rgba_black_preprocess(img: Image):
     width = img.width
     height = img.height
@@ -42,18 +194,18 @@ class DdddOcr(object):
     def __init__(self, ocr: bool = True, det: bool = False, old: bool = False, beta: bool = False,
                  use_gpu: bool = False,
                  device_id: int = 0, show_ad=True, import_onnx_path: str = "", charsets_path: str = ""):
-        if show_ad:
+        if show_ad and os.environ.get('DDDDOCR_NO_AD') != '1':
             print("欢迎使用ddddocr，本项目专注带动行业内卷，个人博客:wenanzhe.com")
             print("训练数据支持来源于:http://146.56.204.113:19199/preview")
             print("爬虫框架feapder可快速一键接入，快速开启爬虫之旅：https://github.com/Boris-code/feapder")
             print(
                 "谷歌reCaptcha验证码 / hCaptcha验证码 / funCaptcha验证码商业级识别接口：https://yescaptcha.com/i/NSwk7i")
-        if not hasattr(Image, 'ANTIALIAS'):
-            setattr(Image, 'ANTIALIAS', Image.LANCZOS)
         self.use_import_onnx = False
         self.__word = False
         self.__resize = []
+        self.__charset = []
         self.__charset_range = []
+        self.__charset_range_index = []
         self.__channel = 1
         if import_onnx_path != "":
             det = False
@@ -2400,62 +2552,65 @@ class DdddOcr(object):
                                   "窭", "铌",
                                   "友", "唉", "怫", "荘"]
         self.det = det
+        # 输入图片均为uint8，(x / 255 - mean) / std 只有256种取值，预先算成查找表
+        values = np.arange(256, dtype=np.float32) / 255.
+        if not self.use_import_onnx:
+            norm_lut = (values - 0.5) / 0.5
+        elif self.__channel == 1:
+            norm_lut = (values - 0.456) / 0.224
+        else:
+            norm_lut = (values - np.array([[0.485], [0.456], [0.406]])) / np.array([[0.229], [0.224], [0.225]])
+        self.__norm_lut = norm_lut.astype(np.float32)
         if use_gpu:
-            self.__providers = [
-                ('CUDAExecutionProvider', {
-                    'device_id': device_id,
-                    'arena_extend_strategy': 'kNextPowerOfTwo',
-                    'cuda_mem_limit': 2 * 1024 * 1024 * 1024,
-                    'cudnn_conv_algo_search': 'EXHAUSTIVE',
-                    'do_copy_in_default_stream': True,
-                }),
-            ]
+            # 按 CUDA > DirectML > CoreML 的顺序选用当前onnxruntime中可用的加速后端，并保留CPU兜底
+            available_providers = get_onnxruntime().get_available_providers()
+            self.__providers = []
+            if 'CUDAExecutionProvider' in available_providers:
+                self.__providers.append(
+                    ('CUDAExecutionProvider', {
+                        'device_id': device_id,
+                        'arena_extend_strategy': 'kNextPowerOfTwo',
+                        'gpu_mem_limit': 2 * 1024 * 1024 * 1024,
+                        'cudnn_conv_algo_search': 'EXHAUSTIVE',
+                        'do_copy_in_default_stream': True,
+                    }))
+            if 'DmlExecutionProvider' in available_providers:
+                self.__providers.append(('DmlExecutionProvider', {'device_id': device_id}))
+            if 'CoreMLExecutionProvider' in available_providers:
+                self.__providers.append('CoreMLExecutionProvider')
+            self.__providers.append('CPUExecutionProvider')
         else:
             self.__providers = [
                 'CPUExecutionProvider',
             ]
         if ocr or det or self.use_import_onnx:
-            self.__ort_session = onnxruntime.InferenceSession(self.__graph_path, providers=self.__providers)
+            # 持有缓存项本身，保证实例存活期间会话不会从弱引用缓存中释放
+            self.__ort_model = load_ort_session(self.__graph_path, self.__providers)
+            self.__ort_session = self.__ort_model.session
+            if det:
+                # 输入节点名固定，提前取出，避免每次检测都调用 get_inputs()
+                self.__det_input_name = self.__ort_session.get_inputs()[0].name
 
     def preproc(self, img, input_size, swap=(2, 0, 1)):
+        cv2 = get_cv2()
         if len(img.shape) == 3:
-            padded_img = np.ones((input_size[0], input_size[1], 3), dtype=np.uint8) * 114
+            shape = (input_size[0], input_size[1], 3)
         else:
-            padded_img = np.ones(input_size, dtype=np.uint8) * 114
+            shape = tuple(input_size)
 
         r = min(input_size[0] / img.shape[0], input_size[1] / img.shape[1])
         resized_img = cv2.resize(
             img,
             (int(img.shape[1] * r), int(img.shape[0] * r)),
             interpolation=cv2.INTER_LINEAR,
-        ).astype(np.uint8)
-        padded_img[: int(img.shape[0] * r), : int(img.shape[1] * r)] = resized_img
-
-        padded_img = padded_img.transpose(swap)
-        padded_img = np.ascontiguousarray(padded_img, dtype=np.float32)
+        )
+        # 直接按交换维度后的布局分配float32填充图，缩放结果写入一次即可，不再额外transpose拷贝
+        padded_img = np.full([shape[i] for i in swap], 114, dtype=np.float32)
+        padded_img.transpose(np.argsort(swap))[: int(img.shape[0] * r), : int(img.shape[1] * r)] = resized_img
         return padded_img, r
 
     def demo_postprocess(self, outputs, img_size, p6=False):
-        grids = []
-        expanded_strides = []
-
-        if not p6:
-            strides = [8, 16, 32]
-        else:
-            strides = [8, 16, 32, 64]
-
-        hsizes = [img_size[0] // stride for stride in strides]
-        wsizes = [img_size[1] // stride for stride in strides]
-
-        for hsize, wsize, stride in zip(hsizes, wsizes, strides):
-            xv, yv = np.meshgrid(np.arange(wsize), np.arange(hsize))
-            grid = np.stack((xv, yv), 2).reshape(1, -1, 2)
-            grids.append(grid)
-            shape = grid.shape[:2]
-            expanded_strides.append(np.full((*shape, 1), stride))
-
-        grids = np.concatenate(grids, 1)
-        expanded_strides = np.concatenate(expanded_strides, 1)
+        grids, expanded_strides = get_grids(tuple(img_size), p6)
         outputs[..., :2] = (outputs[..., :2] + grids) * expanded_strides
         outputs[..., 2:4] = np.exp(outputs[..., 2:4]) * expanded_strides
 
@@ -2470,42 +2625,49 @@ class DdddOcr(object):
 
         areas = (x2 - x1 + 1) * (y2 - y1 + 1)
         order = scores.argsort()[::-1]
+        # 只排序一次，之后按得分顺序用alive标记被抑制的框，不再每轮重新gather剩余下标
+        x1 = x1[order]
+        y1 = y1[order]
+        x2 = x2[order]
+        y2 = y2[order]
+        areas = areas[order]
+        alive = np.ones(order.size, dtype=bool)
 
         keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            xx1 = np.maximum(x1[i], x1[order[1:]])
-            yy1 = np.maximum(y1[i], y1[order[1:]])
-            xx2 = np.minimum(x2[i], x2[order[1:]])
-            yy2 = np.minimum(y2[i], y2[order[1:]])
+        for k in range(order.size):
+            if not alive[k]:
+                continue
+            keep.append(order[k])
+            xx1 = np.maximum(x1[k], x1[k + 1:])
+            yy1 = np.maximum(y1[k], y1[k + 1:])
+            xx2 = np.minimum(x2[k], x2[k + 1:])
+            yy2 = np.minimum(y2[k], y2[k + 1:])
 
             w = np.maximum(0.0, xx2 - xx1 + 1)
             h = np.maximum(0.0, yy2 - yy1 + 1)
             inter = w * h
-            ovr = inter / (areas[i] + areas[order[1:]] - inter)
+            ovr = inter / (areas[k] + areas[k + 1:] - inter)
 
-            inds = np.where(ovr <= nms_thr)[0]
-            order = order[inds + 1]
+            alive[k + 1:] &= ovr <= nms_thr
 
         return keep
 
     def multiclass_nms_class_agnostic(self, boxes, scores, nms_thr, score_thr):
         """Multiclass NMS implemented in Numpy. Class-agnostic version."""
-        cls_inds = scores.argmax(1)
-        cls_scores = scores[np.arange(len(cls_inds)), cls_inds]
-
+        # 先按最高类别得分过滤，只对留下的少量候选框求类别下标
+        cls_scores = scores.max(1)
         valid_score_mask = cls_scores > score_thr
-        if valid_score_mask.sum() == 0:
+        if not valid_score_mask.any():
             return None
         valid_scores = cls_scores[valid_score_mask]
         valid_boxes = boxes[valid_score_mask]
-        valid_cls_inds = cls_inds[valid_score_mask]
+        valid_cls_inds = scores[valid_score_mask].argmax(1)
         keep = self.nms(valid_boxes, valid_scores, nms_thr)
-        if keep:
-            dets = np.concatenate(
-                [valid_boxes[keep], valid_scores[keep, None], valid_cls_inds[keep, None]], 1
-            )
+        if not keep:
+            return None
+        dets = np.concatenate(
+            [valid_boxes[keep], valid_scores[keep, None], valid_cls_inds[keep, None]], 1
+        )
         return dets
 
     def multiclass_nms(self, boxes, scores, nms_thr, score_thr):
@@ -2513,78 +2675,43 @@ class DdddOcr(object):
         return self.multiclass_nms_class_agnostic(boxes, scores, nms_thr, score_thr)
 
     def get_bbox(self, image_bytes):
-        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        cv2 = get_cv2()
+        # 也接受已解码的BGR三通道数组
+        if isinstance(image_bytes, np.ndarray):
+            img = image_bytes
+        else:
+            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
 
         im, ratio = self.preproc(img, (416, 416))
-        ort_inputs = {self.__ort_session.get_inputs()[0].name: im[None, :, :, :]}
+        ort_inputs = {self.__det_input_name: im[None, :, :, :]}
         output = self.__ort_session.run(None, ort_inputs)
         predictions = self.demo_postprocess(output[0], (416, 416))[0]
         boxes = predictions[:, :4]
         scores = predictions[:, 4:5] * predictions[:, 5:]
 
-        boxes_xyxy = np.ones_like(boxes)
-        boxes_xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2.
-        boxes_xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2.
-        boxes_xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2.
-        boxes_xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2.
+        # 中心点与宽高一次性换算为左上、右下角坐标，再原地除以缩放比例
+        half_wh = boxes[:, 2:4] / 2.
+        boxes_xyxy = np.concatenate((boxes[:, :2] - half_wh, boxes[:, :2] + half_wh), axis=1)
         boxes_xyxy /= ratio
 
         pred = self.multiclass_nms(boxes_xyxy, scores, nms_thr=0.45, score_thr=0.1)
-        try:
-            final_boxes = pred[:, :4].tolist()
-            result = []
-            for b in final_boxes:
-                if b[0] < 0:
-                    x_min = 0
-                else:
-                    x_min = int(b[0])
-                if b[1] < 0:
-                    y_min = 0
-                else:
-                    y_min = int(b[1])
-                if b[2] > img.shape[1]:
-                    x_max = int(img.shape[1])
-                else:
-                    x_max = int(b[2])
-                if b[3] > img.shape[0]:
-                    y_max = int(img.shape[0])
-                else:
-                    y_max = int(b[3])
-                result.append([x_min, y_min, x_max, y_max])
-        except Exception as e:
+        # 没有检测到目标时直接返回，不再依赖对None切片抛出异常
+        if pred is None:
             return []
-        return result
+        # 左上角坐标下限为0，右下角坐标上限为图片宽高，再向零取整
+        final_boxes = pred[:, :4].copy()
+        np.maximum(final_boxes[:, :2], 0, out=final_boxes[:, :2])
+        np.minimum(final_boxes[:, 2:], [img.shape[1], img.shape[0]], out=final_boxes[:, 2:])
+        return final_boxes.astype(np.int64).tolist()
 
     def set_ranges(self, charset_range):
         if isinstance(charset_range, int):
-            if charset_range == 0:
-                # 数字
-                self.__charset_range = list("0123456789")
-            elif charset_range == 1:
-                # 小写英文
-                self.__charset_range = list("abcdefghijklmnopqrstuvwxyz")
-            elif charset_range == 2:
-                # 大写英文
-                self.__charset_range = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
-            elif charset_range == 3:
-                # 混合英文
-                self.__charset_range = list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
-            elif charset_range == 4:
-                # 小写英文+数字
-                self.__charset_range = list("abcdefghijklmnopqrstuvwxyz") + list(
-                    "0123456789")
-            elif charset_range == 5:
-                # 大写英文+数字
-                self.__charset_range = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ") + list(
-                    "0123456789")
-            elif charset_range == 6:
-                # 混合大小写+数字
-                self.__charset_range = list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ") + list(
-                    "0123456789")
-            elif charset_range == 7:
+            if charset_range == 7:
                 # 除去英文，数字
-                delete_range = list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ") + list("0123456789")
+                delete_range = set(CHARSET_RANGES[6])
                 self.__charset_range = [item for item in self.__charset if item not in delete_range]
+            elif charset_range in CHARSET_RANGES:
+                self.__charset_range = list(CHARSET_RANGES[charset_range])
         elif isinstance(charset_range, str):
             charset_range_list = list(charset_range)
             self.__charset_range = charset_range_list
@@ -2593,6 +2720,11 @@ class DdddOcr(object):
 
         # 去重
         self.__charset_range = list(set(self.__charset_range)) + [""]
+        # 预先算好限定字符在模型字符集中的下标（未知字符为-1），识别时不再逐个在字符集列表中查找
+        charset_index = {}
+        for i, item in enumerate(self.__charset):
+            charset_index.setdefault(item, i)
+        self.__charset_range_index = [charset_index.get(item, -1) for item in self.__charset_range]
 
 
     def classification(self, img, png_fix: bool = False, probability=False):
@@ -2603,7 +2735,8 @@ class DdddOcr(object):
         if isinstance(img, bytes):
             image = Image.open(io.BytesIO(img))
         elif isinstance(img, Image.Image):
-            image = img.copy()
+            # 后续的 resize / convert 都返回新图片，不会修改传入的图片，无需先完整复制一份
+            image = img
         elif isinstance(img, str):
             image = base64_to_image(img)
         else:
@@ -2627,24 +2760,17 @@ class DdddOcr(object):
                     image = png_rgba_black_preprocess(image)
                 else:
                     image = image.convert('RGB')
-        image = np.array(image).astype(np.float32)
-        image = np.expand_dims(image, axis=0) / 255.
-        if not self.use_import_onnx:
-            image = (image - 0.5) / 0.5
+        # 查表完成归一化，uint8 到 float32 输入只需一次遍历
+        image = np.asarray(image)
+        if image.ndim == 3:
+            image = self.__norm_lut[np.arange(3)[:, None, None], image.transpose((2, 0, 1))]
         else:
-            if self.__channel == 1:
-                image = (image - 0.456) / 0.224
-            else:
-                image = (image - np.array([0.485, 0.456, 0.406])) / np.array([0.229, 0.224, 0.225])
-                image = image[0]
-                image = image.transpose((2, 0, 1))
+            image = self.__norm_lut[image][np.newaxis, :, :]
 
-        ort_inputs = {'input1': np.array([image]).astype(np.float32)}
+        ort_inputs = {'input1': image[np.newaxis]}
         ort_outs = self.__ort_session.run(None, ort_inputs)
         result = []
 
-        last_item = 0
-
         if self.__word:
             for item in ort_outs[1]:
                 result.append(self.__charset[item])
@@ -2653,86 +2779,76 @@ class DdddOcr(object):
                 # 概率输出仅限于使用官方模型
                 if probability:
                     ort_outs = ort_outs[0]
-                    ort_outs = np.exp(ort_outs) / np.sum(np.exp(ort_outs))
-                    ort_outs_sum = np.sum(ort_outs, axis=2)
-                    ort_outs_probability = np.empty_like(ort_outs)
-                    for i in range(ort_outs.shape[0]):
-                        ort_outs_probability[i] = ort_outs[i] / ort_outs_sum[i]
-                    ort_outs_probability = np.squeeze(ort_outs_probability).tolist()
+                    # 逐行softmax，先减去每行最大值防止exp溢出
+                    ort_outs_probability = np.exp(ort_outs - np.max(ort_outs, axis=2, keepdims=True))
+                    ort_outs_probability /= np.sum(ort_outs_probability, axis=2, keepdims=True)
+                    ort_outs_probability = np.squeeze(ort_outs_probability)
                     result = {}
                     if len(self.__charset_range) == 0:
                         # 返回全部
                         result['charsets'] = self.__charset
-                        result['probability'] = ort_outs_probability
+                        result['probability'] = ort_outs_probability.tolist()
                     else:
                         result['charsets'] = self.__charset_range
-                        probability_result_index = []
-                        for item in self.__charset_range:
-                            if item in self.__charset:
-                                probability_result_index.append(self.__charset.index(item))
-                            else:
-                                # 未知字符
-                                probability_result_index.append(-1)
-                        probability_result = []
-                        for item in ort_outs_probability:
-                            probability_result.append([item[i] if i != -1 else -1 for i in probability_result_index ])
+                        # 先在numpy中取出限定范围对应的列再转list，不必把整张概率表转换成python列表
+                        probability_result = ort_outs_probability[..., self.__charset_range_index].tolist()
+                        # 未知字符
+                        unknown_index = [j for j, i in enumerate(self.__charset_range_index) if i == -1]
+                        if unknown_index:
+                            for item in probability_result:
+                                for j in unknown_index:
+                                    item[j] = -1
                         result['probability'] = probability_result
                     return result
                 else:
-                    last_item = 0
-                    argmax_result = np.squeeze(np.argmax(ort_outs[0], axis=2))
-                    for item in argmax_result:
-                        if item == last_item:
-                            continue
-                        else:
-                            last_item = item
-                        if item != 0:
-                            result.append(self.__charset[item])
-                    return ''.join(result)
+                    return ctc_greedy_decode(np.argmax(ort_outs[0], axis=2), self.__charset)
 
             else:
-                last_item = 0
-                for item in ort_outs[0][0]:
-                    if item == last_item:
-                        continue
-                    else:
-                        last_item = item
-                    if item != 0:
-                        result.append(self.__charset[item])
-                return ''.join(result)
+                return ctc_greedy_decode(ort_outs[0][0], self.__charset)
 
     def detection(self, img_bytes: bytes = None, img_base64: str = None):
         if not self.det:
             raise TypeError("当前识别类型为文字识别")
-        if not img_bytes:
-            img_bytes = base64.b64decode(img_base64)
+        cv2 = get_cv2()
+        if isinstance(img_bytes, Image.Image):
+            # PIL图片直接转为BGR数组，省去调用方先编码成图片字节、这里再解码的往返
+            img_bytes = cv2.cvtColor(np.asarray(img_bytes.convert('RGB')), cv2.COLOR_RGB2BGR)
+        elif not isinstance(img_bytes, np.ndarray) and not img_bytes:
+            img_bytes = b64decode(img_base64)
         result = self.get_bbox(img_bytes)
         return result
 
     def get_target(self, img_bytes: bytes = None):
         image = Image.open(io.BytesIO(img_bytes))
         w, h = image.size
+        image_array = np.asarray(image)
+        if image_array.ndim != 3:
+            # 与逐像素getpixel时单通道像素无法取下标的报错类型保持一致
+            raise builtins.TypeError("'int' object is not subscriptable")
+        transparent = image_array[:, :, -1] == 0
         starttx = 0
         startty = 0
         end_x = 0
         end_y = 0
+        # 与逐像素扫描等价的按列处理（坐标为0视为未设置）：
+        # startty 只会被不透明像素移到更小的 y，落在第0行时由该列下一个不透明行接替，每次移动都把 end_y 清零；
+        # end_y 取 startty 最后一次移动之后该列第一个 y>0 的透明行，每个 startty 只设置一次
         for x in range(w):
-            for y in range(h):
-                p = image.getpixel((x, y))
-                if p[-1] == 0:
-                    if startty != 0 and end_y == 0:
-                        end_y = y
-
-                    if starttx != 0 and end_x == 0:
-                        end_x = x
-                else:
-                    if startty == 0:
-                        startty = y
-                        end_y = 0
-                    else:
-                        if y < startty:
-                            startty = y
-                            end_y = 0
+            column = transparent[:, x]
+            opaque_ys = np.flatnonzero(~column).tolist()
+            if starttx != 0 and end_x == 0 and column.any():
+                end_x = x
+            updated_y = None
+            if opaque_ys and (startty == 0 or opaque_ys[0] < startty):
+                startty = updated_y = opaque_ys[0]
+                if startty == 0 and len(opaque_ys) > 1:
+                    startty = updated_y = opaque_ys[1]
+                end_y = 0
+            if startty != 0 and end_y == 0:
+                first = 1 if updated_y is None else updated_y + 1
+                rows = np.flatnonzero(column[first:])
+                if rows.size:
+                    end_y = first + int(rows[0])
             if starttx == 0 and startty != 0:
                 starttx = x
             if end_y != 0:
@@ -2741,6 +2857,7 @@ class DdddOcr(object):
 
     def slide_match(self, target_bytes: bytes = None, background_bytes: bytes = None, simple_target: bool = False,
                     flag: bool = False):
+        cv2 = get_cv2()
         if not simple_target:
             try:
                 target, target_x, target_y = self.get_target(target_bytes)
@@ -2758,12 +2875,10 @@ class DdddOcr(object):
 
         background = cv2.imdecode(np.frombuffer(background_bytes, np.uint8), cv2.IMREAD_ANYCOLOR)
 
+        # Canny输出为单通道边缘图，直接在单通道上匹配，不再复制成三通道，计算量减为三分之一
         background = cv2.Canny(background, 100, 200)
         target = cv2.Canny(target, 100, 200)
 
-        background = cv2.cvtColor(background, cv2.COLOR_GRAY2RGB)
-        target = cv2.cvtColor(target, cv2.COLOR_GRAY2RGB)
-
         res = cv2.matchTemplate(background, target, cv2.TM_CCOEFF_NORMED)
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
         h, w = target.shape[:2]
@@ -2778,21 +2893,20 @@ class DdddOcr(object):
         image = ImageChops.difference(background, target)
         background.close()
         target.close()
-        image = image.point(lambda x: 255 if x > 80 else 0)
+        # 任一通道差值大于80即视为不同的像素，按列统计，找到第一列不同像素不少于5个的位置
+        diff = (np.asarray(image) > 80).any(axis=2)
+        image.close()
         start_y = 0
         start_x = 0
-        for i in range(0, image.width):
-            count = 0
-            for j in range(0, image.height):
-                pixel = image.getpixel((i, j))
-                if pixel != (0, 0, 0):
-                    count += 1
-                if count >= 5 and start_y == 0:
-                    start_y = j - 5
-
-            if count >= 5:
-                start_x = i + 2
-                break
+        columns = np.flatnonzero(np.count_nonzero(diff, axis=0) >= 5)
+        if columns.size:
+            i = int(columns[0])
+            # 该列第5个不同像素所在行往上5个像素为 start_y；恰好为0时按原逐像素扫描的结果顺延到下一行
+            j = int(np.flatnonzero(diff[:, i])[4])
+            start_y = j - 5
+            if start_y == 0 and diff.shape[0] > j + 1:
+                start_y = 1
+            start_x = i + 2
         return {
             "target": [start_x, start_y]
         }
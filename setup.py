@@ -23,8 +23,6 @@ setup(
     packages=find_packages(where='.', exclude=(), include=('*',)),
     classifiers=[
         "Programming Language :: Python :: 3 :: Only",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: 3.11",
@@ -32,8 +30,9 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    install_requires=['numpy', 'onnxruntime', 'Pillow', 'opencv-python-headless'],
-    python_requires='<3.13',
+    install_requires=['numpy<2.0.0', 'onnxruntime>=1.17', 'Pillow', 'opencv-python-headless'],
+    extras_require={'fast': ['pybase64']},
+    python_requires='>=3.9,<3.13',
     include_package_data=True,
     install_package_data=True,
 )